@@ -0,0 +1,46 @@
+"""
+SQLite storage for GitHub webhook events, shared by the webhook server (writer)
+and the MCP server (reader).
+"""
+import sqlite3
+from pathlib import Path
+from typing import Union
+
+EVENTS_DB = Path(__file__).parent / "github_events.db"
+# Events kept in the database; older rows are pruned on insert
+EVENTS_KEEP = 100
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    body BLOB NOT NULL
+);
+-- Ring buffer: every insert drops the rows that fell out of the last {EVENTS_KEEP}
+CREATE TRIGGER IF NOT EXISTS prune_events AFTER INSERT ON events BEGIN
+    DELETE FROM events WHERE id <= NEW.id - {EVENTS_KEEP};
+END;
+"""
+
+
+def connect_writer(path: Union[str, Path] = EVENTS_DB) -> sqlite3.Connection:
+    """
+    Open (creating if needed) the events database for writing.
+
+    WAL mode lets the MCP server read while webhooks are being written, and
+    lets several webhook worker processes share the database. With
+    synchronous=NORMAL a commit does not fsync; WAL checkpoints do.
+    """
+    conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def connect_reader(path: Union[str, Path] = EVENTS_DB) -> sqlite3.Connection:
+    """Open the events database read-only; raises FileNotFoundError if it does not exist yet."""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(path)
+    return sqlite3.connect(f"{path.absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
@@ -1,12 +1,14 @@
 """
 Logging configuration for the GitHub MCP project.
 """
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 # Default log format
 DEFAULT_LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -18,13 +20,50 @@ LOG_FILE = LOG_DIR / "github_mcp.log"
 LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
 LOG_BACKUP_COUNT = 5
 
+# One queue-backed handler per log file, shared by every logger that writes to it
+_FILE_HANDLERS: Dict[Path, logging.handlers.QueueHandler] = {}
+
+
+def _get_file_handler(log_file: Path, formatter: logging.Formatter) -> logging.handlers.QueueHandler:
+    """
+    Return the shared handler for log_file, creating it on first use.
+
+    Records are put on a queue and written to disk by a background
+    QueueListener thread, so logging calls never block on file I/O or
+    rollover. Loggers writing to the same file share one FD and one
+    rollover state.
+    """
+    queue_handler = _FILE_HANDLERS.get(log_file)
+    if queue_handler is None:
+        # Ensure the logs directory exists
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            str(log_file),
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(-1)
+        listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        # Flush whatever is still queued on interpreter shutdown
+        atexit.register(listener.stop)
+
+        # Level filtering is left to each logger, since the handler is shared
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        _FILE_HANDLERS[log_file] = queue_handler
+    return queue_handler
+
 
 def setup_logger(
     name: str,
     log_level: int = DEFAULT_LEVEL,
     log_file: Optional[Path] = None,
     log_format: str = DEFAULT_LOG_FORMAT,
-    console: bool = True,
+    console: Optional[bool] = None,
 ) -> logging.Logger:
     """
     Set up a logger with both console and file handlers.
@@ -34,7 +73,7 @@ def setup_logger(
         log_level: Logging level (default: logging.DEBUG)
         log_file: Path to log file (default: logs/github_mcp.log)
         log_format: Log message format
-        console: Whether to log to console (default: True)
+        console: Whether to log to stderr (default: only when stderr is a terminal)
 
     Returns:
         Configured logger instance
@@ -42,9 +81,9 @@ def setup_logger(
     # Create logger
     logger = logging.getLogger(name)
     
-    # Remove any existing handlers to avoid duplicates
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
+    # Already configured (e.g. module imported or reloaded twice); keep its handlers
+    if getattr(logger, "_configured", False):
+        return logger
     
     logger.setLevel(log_level)
     logger.propagate = False  # Prevent propagation to root logger
@@ -59,34 +98,23 @@ def setup_logger(
         log_file = Path(log_file).absolute()
 
     try:
-        # Ensure the logs directory exists
-        log_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Create file handler with error handling
-        file_handler = logging.handlers.RotatingFileHandler(
-            str(log_file), 
-            maxBytes=LOG_MAX_BYTES, 
-            backupCount=LOG_BACKUP_COUNT, 
-            encoding="utf-8"
-        )
-        file_handler.setLevel(log_level)
-        file_handler.setFormatter(formatter)
-        
-        # Add file handler
-        logger.addHandler(file_handler)
+        # Add the (shared) file handler
+        logger.addHandler(_get_file_handler(log_file, formatter))
         
-        # Test file handler
-        logger.debug("Debug message - this should appear in the log")
-        logger.info(f"Initialized logger for {name}. Log level: {logging.getLevelName(log_level)}")
+        logger.info("Initialized logger for %s. Log level: %s", name, logging.getLevelName(log_level))
         
     except Exception as e:
         print(f"Failed to set up file logging to {log_file}: {e}", file=sys.stderr)
         print("Falling back to console logging only.", file=sys.stderr)
         console = True  # Ensure console logging is enabled if file logging fails
 
-    # Create console handler if requested
+    # Create console handler if requested. It writes to stderr, since stdout
+    # carries the MCP stdio protocol, and by default is skipped when stderr is
+    # not a terminal (e.g. when spawned by an MCP client)
+    if console is None:
+        console = sys.stderr.isatty()
     if console:
-        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler = logging.StreamHandler(sys.stderr)
         console_handler.setLevel(log_level)
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
@@ -96,6 +124,7 @@ def setup_logger(
     root_logger.handlers = []
     root_logger.addHandler(logging.NullHandler())
 
+    logger._configured = True
     return logger
 
 
@@ -4,33 +4,72 @@ GitHub Actions Integration with MCP Prompts
 Handles webhooks and CI/CD workflows for PR agent.
 """
 
-import json
+import asyncio
+import bisect
+import functools
+import logging
 import os
+import shutil
+import sqlite3
 import subprocess
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from typing import Optional
 from pathlib import Path
 
+import orjson
 from mcp.server.fastmcp import FastMCP
 from logger import setup_logger
+from events_db import EVENTS_DB, connect_reader
 
 logger = setup_logger(__name__)
 
 
 os.environ
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-mcp = FastMCP("pr-agent-actions")
 
-SCRIPT_DIR = Path(__file__).resolve().parent
+
+@asynccontextmanager
+async def _lifespan(server: FastMCP):
+    """Stop the cached git cat-file processes when the server shuts down."""
+    try:
+        yield {}
+    finally:
+        await _close_git_repos()
+
+
+mcp = FastMCP("pr-agent-actions", lifespan=_lifespan)
+
+SCRIPT_FILE = Path(__file__).resolve()
+SCRIPT_DIR = SCRIPT_FILE.parent
 TEMPLATES_DIR = SCRIPT_DIR / "templates"
-EVENTS_FILE = SCRIPT_DIR / "github_events.json"
+
+DIFF_NOT_INCLUDED = "Diff not included (set include_diff=true to see full diff)"
+# git executable, resolved once instead of a PATH search on every spawn
+GIT = shutil.which("git") or "git"
+# Repositories that keep a warm `git cat-file --batch-check` process
+GIT_REPO_CACHE_SIZE = 8
+# Longest single diff line we buffer while streaming (minified files etc.); the
+# rest of a longer line is dropped
+DIFF_LINE_LIMIT = 8 * 1024 * 1024
 
 # logger = get_logger(__name__)
 
-logger.debug(f"Script directory: {SCRIPT_DIR}")
-logger.debug(f"Templates directory: {TEMPLATES_DIR}")
-logger.debug(f"Templates directory exists: {TEMPLATES_DIR.exists()}")
-if TEMPLATES_DIR.exists():
-    logger.debug(f"Found templates: {list(TEMPLATES_DIR.glob('*.md'))}")
+# Resolved once; error responses and debug output reuse these strings
+_SCRIPT_FILE_STR = str(SCRIPT_FILE)
+_SCRIPT_DIR_STR = str(SCRIPT_DIR)
+
+logger.debug("Current working directory: %s", os.getcwd())
+logger.debug("Script file location: %s", _SCRIPT_FILE_STR)
+logger.debug("Script directory: %s", _SCRIPT_DIR_STR)
+logger.debug("Templates directory: %s", TEMPLATES_DIR)
+
+# Make sure the templates directory exists once, here, rather than probing it per call
+try:
+    TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+except OSError as e:
+    logger.warning("Could not create templates directory %s: %s", TEMPLATES_DIR, e)
 
 DEFAULT_TEMPLATES = {
     "bug.md": "Bug Fix",
@@ -58,6 +97,352 @@ TYPE_MAPPING = {
     "security": "security.md"
 }
 
+# Used when change_type isn't in TYPE_MAPPING
+DEFAULT_TEMPLATE_FILE = "feature.md"
+
+
+def _dumps(obj) -> str:
+    """Serialize a tool response as compact JSON (MCP tools return str)."""
+    return orjson.dumps(obj).decode()
+
+# Loaded templates keyed by path, as (st_mtime_ns, template)
+_TEMPLATE_CACHE: dict[Path, tuple[int, dict]] = {}
+# Last templates listing, keyed by templates dir, filenames and mtimes
+_TEMPLATES_RESULT: Optional[tuple[tuple, dict]] = None
+# That listing serialized for get_pr_templates, keyed by the listing itself
+_TEMPLATES_RESPONSE: Optional[tuple[dict, str]] = None
+
+
+@functools.lru_cache(maxsize=4)
+def _template_paths(templates_dir: Path) -> dict[str, Path]:
+    """Paths of the default templates in templates_dir, built once per directory."""
+    return {filename: templates_dir / filename for filename in DEFAULT_TEMPLATES}
+
+
+def _load_template(filename: str) -> tuple[int, dict]:
+    """Return (st_mtime_ns, template) for a template file, re-reading it only when it changed on disk.
+
+    The template dict has the shape get_pr_templates lists and is shared
+    between calls, so callers must not mutate it.
+    """
+    template_path = _template_paths(TEMPLATES_DIR)[filename]
+    mtime_ns = template_path.stat().st_mtime_ns
+    cached = _TEMPLATE_CACHE.get(template_path)
+    if cached is None or cached[0] != mtime_ns:
+        template = {
+            "filename": filename,
+            "type": DEFAULT_TEMPLATES[filename],
+            "content": template_path.read_text(encoding='utf-8')
+        }
+        cached = (mtime_ns, template)
+        _TEMPLATE_CACHE[template_path] = cached
+    return cached
+
+
+# (database path, inode, read-only connection) for the events database, opened on first use
+_EVENTS_CONN: Optional[tuple[Path, int, sqlite3.Connection]] = None
+# (data_version, row ids, events) from the last read of the events database
+_EVENTS_CACHE: Optional[tuple[int, list, list]] = None
+
+
+def _events_conn() -> sqlite3.Connection:
+    """Return the read-only connection, reopening it if the database file was replaced."""
+    global _EVENTS_CONN, _EVENTS_CACHE
+    try:
+        ino = os.stat(EVENTS_DB).st_ino
+    except FileNotFoundError:
+        ino = None
+    if _EVENTS_CONN is None or _EVENTS_CONN[:2] != (EVENTS_DB, ino):
+        # A connection to a deleted or recreated file would keep reading the old data
+        if _EVENTS_CONN is not None:
+            _EVENTS_CONN[2].close()
+            _EVENTS_CONN = None
+        _EVENTS_CACHE = None
+        _EVENTS_CONN = (EVENTS_DB, ino, connect_reader(EVENTS_DB))
+    return _EVENTS_CONN[2]
+
+
+def _load_events() -> list:
+    """Return the stored events, oldest first, parsing only rows added since the last call.
+
+    PRAGMA data_version changes whenever another connection commits, so an
+    unchanged database costs one pragma. Raises FileNotFoundError when the
+    webhook server has not created the database yet. The returned list is
+    shared with the cache and must not be modified.
+    """
+    global _EVENTS_CACHE
+    conn = _events_conn()
+    (version,) = conn.execute("PRAGMA data_version").fetchone()
+    cache = _EVENTS_CACHE
+    if cache is not None and cache[0] == version:
+        return cache[2]
+    
+    # One read transaction, so the bounds and the new rows come from the same snapshot
+    conn.execute("BEGIN")
+    try:
+        try:
+            lo, hi = conn.execute(
+                "SELECT (SELECT min(id) FROM events), (SELECT max(id) FROM events)"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # The database file exists but the table has not been created yet
+            return []
+        
+        if cache is None or hi is None or (cache[1] and hi < cache[1][-1]):
+            # First read, or the table was emptied or recreated
+            ids, events = [], []
+        else:
+            # Drop the rows pruned since the last read
+            start = bisect.bisect_left(cache[1], lo)
+            ids, events = cache[1][start:], cache[2][start:]
+        
+        last_id = ids[-1] if ids else 0
+        for row_id, body in conn.execute("SELECT id, body FROM events WHERE id > ? ORDER BY id", (last_id,)):
+            ids.append(row_id)
+            events.append(orjson.loads(body))
+    finally:
+        conn.rollback()
+    
+    _EVENTS_CACHE = (version, ids, events)
+    return events
+
+
+@dataclass(slots=True)
+class _GitResult:
+    """Empty stand-in for a git result when the command could not be run."""
+    stdout: bytes = b""
+    stderr: str = ""
+
+
+async def _git(
+    *args: str,
+    cwd: str,
+    timeout: float,
+    check: bool = False,
+    text: bool = True
+) -> subprocess.CompletedProcess:
+    """Run a git command without blocking the event loop.
+
+    Mirrors ``subprocess.run(..., capture_output=True)`` so callers can keep
+    using ``.stdout``/``.stderr`` on the result. stderr is always decoded;
+    pass ``text=False`` to get stdout as raw bytes.
+    """
+    cmd = [GIT, *args]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        close_fds=False  # our own FDs are non-inheritable; skip the close sweep
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException as e:
+        # Timed out, or cancelled because a sibling git command failed
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        if isinstance(e, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        raise
+
+    result = subprocess.CompletedProcess(
+        cmd, proc.returncode, stdout.decode() if text else stdout, stderr.decode()
+    )
+    if check:
+        result.check_returncode()
+    return result
+
+
+async def _git_head(*args: str, cwd: str, timeout: float, max_lines: int) -> tuple[str, int]:
+    """Stream a git command's stdout, keeping only the first ``max_lines`` lines.
+
+    Returns the kept text and the total number of lines git produced. Output
+    past the cap is counted and discarded, so memory stays O(max_lines)
+    instead of O(output size). Lines longer than DIFF_LINE_LIMIT are cut to
+    that length.
+    """
+    cmd = [GIT, *args]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        cwd=cwd,
+        limit=DIFF_LINE_LIMIT,
+        close_fds=False
+    )
+
+    async def _readline() -> bytes:
+        # Like readline(), which raises ValueError on an overlong line and
+        # throws away what it had buffered
+        try:
+            return await proc.stdout.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            return e.partial  # EOF, possibly after a last line without newline
+        except asyncio.LimitOverrunError as e:
+            # The first e.consumed bytes hold no newline: keep them, then skip
+            # to the end of the line
+            line = await proc.stdout.readexactly(min(e.consumed, DIFF_LINE_LIMIT))
+        while True:
+            try:
+                await proc.stdout.readuntil(b"\n")
+            except asyncio.IncompleteReadError:
+                return line
+            except asyncio.LimitOverrunError as e:
+                await proc.stdout.readexactly(e.consumed)
+                continue
+            return line + b"\n"
+
+    async def _read() -> tuple[str, int]:
+        # Raw bytes are accumulated and decoded once at the end
+        buf = bytearray()
+        count = 0
+        while count < max_lines:
+            line = await _readline()
+            if not line:
+                break
+            buf += line
+            count += 1
+        else:
+            while chunk := await proc.stdout.read(64 * 1024):
+                count += chunk.count(b"\n")
+        return buf.decode(errors="replace"), count
+
+    try:
+        result = await asyncio.wait_for(_read(), timeout)
+    except BaseException as e:
+        if proc.returncode is None:
+            proc.kill()
+        if isinstance(e, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        raise
+    finally:
+        await proc.wait()
+    return result
+
+
+async def _noop():
+    return None
+
+
+class GitRepo:
+    """A long-lived ``git cat-file --batch-check`` process for one repository.
+
+    Revision lookups are written to the process's stdin instead of forking a
+    new git for each one. The process is started on first use and restarted
+    if the event loop changes. If it exits on its own (cwd is not a git
+    repository, say), lookups return None from then on and callers take
+    their normal path.
+    """
+
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        self._loop = None
+        self._lock = None
+        self._proc = None
+        self._failed = False
+
+    async def resolve(self, rev: str, timeout: float) -> Optional[str]:
+        """Return the object id ``rev`` names, or None if it doesn't resolve."""
+        if "\n" in rev:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pipes and locks belong to the loop that created them
+            self.close()
+            self._loop, self._lock = loop, asyncio.Lock()
+
+        async with self._lock:
+            if self._failed:
+                return None
+            if self._proc is None or self._proc.returncode is not None:
+                self._proc = await asyncio.create_subprocess_exec(
+                    GIT, "cat-file", "--batch-check",
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    cwd=self.cwd,
+                    close_fds=False
+                )
+            try:
+                self._proc.stdin.write(rev.encode() + b"\n")
+                await self._proc.stdin.drain()
+                line = await asyncio.wait_for(self._proc.stdout.readline(), timeout)
+            except asyncio.TimeoutError:
+                self.close()
+                raise subprocess.TimeoutExpired([GIT, "cat-file", "--batch-check"], timeout)
+            except (BrokenPipeError, ConnectionResetError):
+                line = b""
+            if not line:
+                # git exited instead of answering; respawning would fail the same way
+                logger.debug("git cat-file exited in %s, not resolving revisions there", self.cwd)
+                self.close()
+                self._failed = True
+                return None
+
+        # "<oid> <type> <size>" on success, "<rev> missing" / "<rev> ambiguous" otherwise
+        fields = line.split()
+        found = len(fields) == 3 and fields[2].isdigit()
+        return fields[0].decode() if found else None
+
+    def close(self):
+        """Stop the batch process; it exits on its own once stdin hits EOF."""
+        proc, self._proc = self._proc, None
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.stdin.close()
+        except RuntimeError:
+            # The loop that owns the pipe is already closed
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+
+    async def aclose(self):
+        """Stop the batch process and wait for it to exit."""
+        proc = self._proc
+        self.close()
+        # A process started on another loop can only be waited for from that loop
+        if proc is not None and self._loop is asyncio.get_running_loop():
+            await proc.wait()
+
+
+_GIT_REPOS: "OrderedDict[str, GitRepo]" = OrderedDict()
+
+
+def _git_repo(cwd: str) -> GitRepo:
+    """Return the GitRepo for cwd, keeping the most recently used GIT_REPO_CACHE_SIZE alive."""
+    key = os.path.abspath(cwd)
+    repo = _GIT_REPOS.get(key)
+    if repo is None:
+        repo = _GIT_REPOS[key] = GitRepo(key)
+        if len(_GIT_REPOS) > GIT_REPO_CACHE_SIZE:
+            _, evicted = _GIT_REPOS.popitem(last=False)
+            evicted.close()
+    else:
+        _GIT_REPOS.move_to_end(key)
+    return repo
+
+
+async def _close_git_repos():
+    """Stop every cached cat-file process."""
+    repos = list(_GIT_REPOS.values())
+    _GIT_REPOS.clear()
+    await asyncio.gather(*(repo.aclose() for repo in repos))
+
+
+def _empty_analysis(base_branch: str, include_diff: bool) -> str:
+    """Response for analyze_file_changes when there is nothing to compare."""
+    return _dumps({
+        "base_branch": base_branch,
+        "files_changed": [],
+        "statistics": "",
+        "commits": "",
+        "diff": "" if include_diff else DIFF_NOT_INCLUDED,
+        "truncated": False,
+        "total_diff_lines": 0
+    })
 
 
 @mcp.tool()
@@ -76,7 +461,10 @@ async def analyze_file_changes(
         max_diff_lines: Maximum number of diff lines to include (default: 500)
         working_directory: Directory to run git commands in (default: current directory)
     """
-    logger.debug(f"Starting analyze_file_changes with base_branch={base_branch}, include_diff={include_diff}, max_diff_lines={max_diff_lines}")
+    logger.debug(
+        "Starting analyze_file_changes with base_branch=%s, include_diff=%s, max_diff_lines=%s",
+        base_branch, include_diff, max_diff_lines
+    )
     
     try:
         if working_directory is None:
@@ -88,118 +476,111 @@ async def analyze_file_changes(
                 root = roots_result.roots[0]
                 # FileUrl object has a .path property that gives us the path directly
                 working_directory = root.uri.path
-                logger.debug(f"Got working directory from MCP context: {working_directory}")
+                logger.debug("Got working directory from MCP context: %s", working_directory)
             except Exception as e:
                 logger.warning(f"Could not get working directory from MCP context: {e}", exc_info=True)
         
         cwd = working_directory if working_directory else os.getcwd()
-        logger.debug(f"Using working directory: {cwd}")
+        logger.debug("Using working directory: %s", cwd)
         
-        # Get changed files with progress indicator
-        logger.debug("Getting list of changed files...")
+        # Resolve both ends through the repo's warm cat-file process; if they
+        # are the same commit there is nothing to diff and no git is forked
+        repo = _git_repo(cwd)
+        base_oid = await repo.resolve(base_branch, command_timeout)
+        if base_oid is not None and base_oid == await repo.resolve("HEAD", command_timeout):
+            logger.debug("%s and HEAD are the same commit, nothing to analyze", base_branch)
+            return _empty_analysis(base_branch, include_diff)
         
-        # First, get the list of changed files (faster than getting full diff)
-        try:
-            logger.debug("Getting list of modified files...")
-            files_result = subprocess.run(
-                ["git", "diff", "--name-only", f"{base_branch}..HEAD"],
-                capture_output=True,
-                text=True,
-                check=True,
-                cwd=cwd,
-                timeout=command_timeout  # Should be fast for just file names
-            )
-            changed_files = [f.strip() for f in files_result.stdout.splitlines() if f.strip()]
-            logger.debug(f"Found {len(changed_files)} changed files")
-            
-            # If we need the status, get it separately
-            if changed_files:
-                logger.debug("Getting status of changed files...")
-                status_result = subprocess.run(
-                    ["git", "diff", "--name-status", "--no-renames", f"{base_branch}..HEAD", "--"] + changed_files[:100],  # Limit to first 100 files if many
-                    capture_output=True,
-                    text=True,
-                    check=True,
-                    cwd=cwd,
-                    timeout=command_timeout
+        async def _changed_files():
+            try:
+                # -z: NUL-separated, unquoted paths, left as bytes until parsed
+                return await _git(
+                    "diff", "-z", "--name-status", "--no-renames", f"{base_branch}..HEAD",
+                    cwd=cwd, timeout=command_timeout, check=True, text=False
                 )
-                files_result.stdout = status_result.stdout
-            else:
-                files_result.stdout = ""
-                
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Git command failed: {e.stderr}")
-            files_result = type('', (), {'stdout': '', 'stderr': e.stderr})()
-        except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            files_result = type('', (), {'stdout': '', 'stderr': str(e)})()
-        logger.debug(f"Got {len(files_result.stdout.splitlines())} changed files")
+            except subprocess.CalledProcessError as e:
+                logger.error(f"Git command failed: {e.stderr}")
+                return _GitResult(stderr=e.stderr)
+            except Exception as e:
+                logger.error(f"Unexpected error: {str(e)}")
+                return _GitResult(stderr=str(e))
+
+        logger.debug("Getting list of changed files...")
+        files_result = await _changed_files()
+        # Output is status\0path\0status\0path\0...; only paths can be non-ASCII
+        fields = files_result.stdout.split(b'\0')
+        files = [
+            {"status": status.decode('ascii'), "path": path.decode('utf-8', 'replace')}
+            for status, path in zip(fields[0::2], fields[1::2])
+        ]
+        logger.debug("Got %d changed files", len(files))
         
-        # Get diff statistics
-        logger.debug("Getting diff statistics...")
-        stat_result = subprocess.run(
-            ["git", "diff", "--stat", f"{base_branch}...HEAD"],
-            capture_output=True,
-            text=True,
-            cwd=cwd,
-            timeout=command_timeout
-        )
-        logger.debug(f"Diff statistics: {stat_result.stdout.strip() or 'No changes'}")
+        # Nothing to analyze: don't spawn the stat/diff/log processes at all. A
+        # failed listing (_GitResult) falls through so those commands can
+        # surface the actual error.
+        if not files and not isinstance(files_result, _GitResult):
+            logger.debug("No changed files, skipping diff statistics, diff and commit history")
+            return _empty_analysis(base_branch, include_diff)
+        
+        # Fire the remaining git commands at once; latency is that of the slowest one
+        logger.debug("Running git stat/diff/log concurrently...")
+        tasks = [asyncio.ensure_future(coro) for coro in (
+            _git("diff", "--stat", f"{base_branch}...HEAD", cwd=cwd, timeout=command_timeout),
+            _git_head(
+                "diff", f"{base_branch}...HEAD",
+                cwd=cwd, timeout=command_timeout, max_lines=max_diff_lines
+            ) if include_diff else _noop(),
+            _git("log", "--oneline", f"{base_branch}..HEAD", cwd=cwd, timeout=command_timeout)
+        )]
+        try:
+            stat_result, diff_result, commits_result = await asyncio.gather(*tasks)
+        except BaseException:
+            # gather() leaves the others running; stop them and their git processes
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Diff statistics: %s", stat_result.stdout.strip() or 'No changes')
         
         diff_content = ""
         truncated = False
+        total_diff_lines = 0
         
         if include_diff:
-            logger.debug("Getting full diff content...")
-            diff_result = subprocess.run(
-                ["git", "diff", f"{base_branch}...HEAD"],
-                capture_output=True,
-                text=True,
-                cwd=cwd,
-                timeout=command_timeout
-            )
-            diff_lines = diff_result.stdout.split('\n')
-            logger.debug(f"Got {len(diff_lines)} lines of diff")
+            diff_content, total_diff_lines = diff_result
+            logger.debug("Got %d lines of diff", total_diff_lines)
             
-            if len(diff_lines) > max_diff_lines:
-                logger.debug(f"Truncating diff from {len(diff_lines)} to {max_diff_lines} lines")
-                diff_content = '\n'.join(diff_lines[:max_diff_lines])
-                diff_content += f"\n\n... Output truncated. Showing {max_diff_lines} of {len(diff_lines)} lines ..."
-                diff_content += "\n... Use max_diff_lines parameter to see more ..."
+            if total_diff_lines > max_diff_lines:
+                logger.debug("Truncated diff from %d to %d lines", total_diff_lines, max_diff_lines)
+                diff_content += (
+                    f"\n... Output truncated. Showing {max_diff_lines} of {total_diff_lines} lines ..."
+                    "\n... Use max_diff_lines parameter to see more ..."
+                )
                 truncated = True
-            else:
-                diff_content = diff_result.stdout
         else:
             logger.debug("Skipping full diff content as include_diff is False")
         
-        # Get commit history
-        logger.debug("Getting commit history...")
-        commits_result = subprocess.run(
-            ["git", "log", "--oneline", f"{base_branch}..HEAD"],
-            capture_output=True,
-            text=True,
-            cwd=cwd
-        )
         commits = commits_result.stdout.splitlines()
-        logger.debug(f"Found {len(commits)} commits in the current branch")
+        logger.debug("Found %d commits in the current branch", len(commits))
         
         analysis = {
             "base_branch": base_branch,
-            "files_changed": files_result.stdout,
+            "files_changed": files,
             "statistics": stat_result.stdout,
             "commits": commits_result.stdout,
-            "diff": diff_content if include_diff else "Diff not included (set include_diff=true to see full diff)",
+            "diff": diff_content if include_diff else DIFF_NOT_INCLUDED,
             "truncated": truncated,
-            "total_diff_lines": len(diff_lines) if include_diff else 0
+            "total_diff_lines": total_diff_lines
         }
         
-        logger.debug(f"Analysis complete. Returning {len(analysis)} items in the response")
-        return json.dumps(analysis, indent=2)
+        logger.debug("Analysis complete. Returning %d items in the response", len(analysis))
+        return _dumps(analysis)
         
     except subprocess.TimeoutExpired as e:
         error_msg = f"Git command timed out after {e.timeout} seconds. The repository might be too large or the diff too complex."
         logger.error(error_msg, exc_info=True)
-        return json.dumps({
+        return _dumps({
             "error": "Git command timeout",
             "details": error_msg,
             "solution": "Try with a higher timeout value using the 'command_timeout' parameter"
@@ -208,7 +589,7 @@ async def analyze_file_changes(
     except subprocess.CalledProcessError as e:
         error_msg = f"Git command failed with exit code {e.returncode}: {e.stderr or e.stdout or 'No output'}"
         logger.error(error_msg, exc_info=True)
-        return json.dumps({
+        return _dumps({
             "error": "Git command execution failed",
             "details": error_msg,
             "command": " ".join(e.cmd) if hasattr(e, 'cmd') else "unknown"
@@ -217,16 +598,16 @@ async def analyze_file_changes(
     except FileNotFoundError as e:
         error_msg = "Git command not found. Make sure Git is installed and in your PATH."
         logger.error(error_msg, exc_info=True)
-        return json.dumps({
+        return _dumps({
             "error": "Git not found",
             "details": error_msg,
             "solution": "Please install Git and ensure it's available in your system PATH"
         })
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONEncodeError as e:
         error_msg = f"Failed to serialize the response: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        return json.dumps({
+        return _dumps({
             "error": "Serialization error",
             "details": error_msg
         })
@@ -234,7 +615,7 @@ async def analyze_file_changes(
     except PermissionError as e:
         error_msg = f"Permission denied when accessing {e.filename if hasattr(e, 'filename') else 'the specified directory'}"
         logger.error(error_msg, exc_info=True)
-        return json.dumps({
+        return _dumps({
             "error": "Permission denied",
             "details": error_msg,
             "solution": "Check file permissions and ensure the application has the necessary access rights"
@@ -244,7 +625,7 @@ async def analyze_file_changes(
         error_type = type(e).__name__
         error_msg = f"Unexpected {error_type} in analyze_file_changes: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        return json.dumps({
+        return _dumps({
             "error": f"Unexpected {error_type}",
             "details": str(e),
             "context": {
@@ -256,82 +637,122 @@ async def analyze_file_changes(
         })
 
 
+def _get_pr_templates_dict() -> dict:
+    """Load every PR template; the same dict is returned while nothing changes on disk."""
+    global _TEMPLATES_RESULT
+    logger.debug("\n=== get_pr_templates called ===")
+    logger.debug("Templates directory: %s", TEMPLATES_DIR)
+        
+    templates = []
+    mtimes = []
+    for filename, template_path in _template_paths(TEMPLATES_DIR).items():
+        logger.debug("\nChecking template: %s", filename)
+        logger.debug("Full path: %s", template_path)
+        
+        try:
+            mtime_ns, template = _load_template(filename)
+        except FileNotFoundError:
+            logger.warning(f"Warning: Template file not found: {template_path}")
+            continue
+        except Exception as e:
+            logger.error(f"Error reading {filename}: {str(e)}")
+            continue
+        
+        mtimes.append(mtime_ns)
+        templates.append(template)
+        logger.debug("Successfully loaded: %s", filename)
+    
+    if not templates:
+        # Only now look at the directory itself, to explain the failure
+        try:
+            TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+        except Exception as mkdir_error:
+            return {
+                "error": f"Templates directory not found and could not be created: {TEMPLATES_DIR}",
+                "mkdir_error": str(mkdir_error),
+                "current_working_directory": str(Path.cwd()),
+                "script_location": _SCRIPT_FILE_STR,
+                "script_parent": _SCRIPT_DIR_STR
+            }
+        available_files = list(TEMPLATES_DIR.glob('*'))
+        return {
+            "error": "No templates could be loaded",
+            "available_files": [str(f) for f in available_files],
+            "templates_dir": str(TEMPLATES_DIR),
+            "templates_dir_exists": TEMPLATES_DIR.exists(),
+            "hint": "Please create template files (.md) in the templates directory"
+        }
+    
+    # Nothing changed on disk since the last call: reuse the previous result
+    result_key = (TEMPLATES_DIR, tuple(t["filename"] for t in templates), tuple(mtimes))
+    if _TEMPLATES_RESULT is not None and _TEMPLATES_RESULT[0] == result_key:
+        return _TEMPLATES_RESULT[1]
+    
+    result = {
+        "templates": templates,
+        "templates_dir": str(TEMPLATES_DIR)
+    }
+    _TEMPLATES_RESULT = (result_key, result)
+    return result
+
+
 @mcp.tool()
 async def get_pr_templates() -> str:
     """List available PR templates with their content."""
+    global _TEMPLATES_RESPONSE
     try:
-        logger.debug(f"\n=== get_pr_templates called ===")
-        logger.debug(f"Current working directory: {Path.cwd()}")
-        logger.debug(f"Script file location: {Path(__file__).resolve()}")
-        logger.debug(f"Script directory: {SCRIPT_DIR}")
-        logger.debug(f"Templates directory: {TEMPLATES_DIR}")
-        logger.debug(f"Templates directory exists: {TEMPLATES_DIR.exists()}")
-        
-        if not TEMPLATES_DIR.exists():
-            # Try to create it if it doesn't exist
-            try:
-                TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
-                logger.debug(f"Created templates directory: {TEMPLATES_DIR}")
-            except Exception as mkdir_error:
-                return json.dumps({
-                    "error": f"Templates directory not found and could not be created: {TEMPLATES_DIR}",
-                    "mkdir_error": str(mkdir_error),
-                    "current_working_directory": str(Path.cwd()),
-                    "script_location": str(Path(__file__).resolve()),
-                    "script_parent": str(Path(__file__).resolve().parent)
-                }, indent=2)
-            
-        templates = []
-        for filename, template_type in DEFAULT_TEMPLATES.items():
-            template_path = TEMPLATES_DIR / filename
-            logger.debug(f"\nChecking template: {filename}")
-            logger.debug(f"Full path: {template_path}")
-            logger.debug(f"Exists: {template_path.exists()}")
-            
-            if not template_path.exists():
-                logger.warning(f"Warning: Template file not found: {template_path}")
-                continue
-                
-            try:
-                content = template_path.read_text(encoding='utf-8')
-                templates.append({
-                    "filename": filename,
-                    "type": template_type,
-                    "content": content
-                })
-                logger.debug(f"Successfully loaded: {filename}")
-            except Exception as e:
-                logger.error(f"Error reading {filename}: {str(e)}")
-                continue
-        
-        if not templates:
-            available_files = list(TEMPLATES_DIR.glob('*'))
-            return json.dumps({
-                "error": "No templates could be loaded",
-                "available_files": [str(f) for f in available_files],
-                "templates_dir": str(TEMPLATES_DIR),
-                "templates_dir_exists": TEMPLATES_DIR.exists(),
-                "hint": "Please create template files (.md) in the templates directory"
-            }, indent=2)
-            
-        return json.dumps({
-            "templates": templates,
-            "templates_dir": str(TEMPLATES_DIR)
-        }, indent=2)
+        result = _get_pr_templates_dict()
+        if _TEMPLATES_RESPONSE is not None and _TEMPLATES_RESPONSE[0] is result:
+            return _TEMPLATES_RESPONSE[1]
+        response = _dumps(result)
+        if "error" not in result:
+            _TEMPLATES_RESPONSE = (result, response)
+        return response
         
     except Exception as e:
         import traceback
         error_details = {
             "error": f"Unexpected error: {str(e)}",
             "traceback": traceback.format_exc(),
-            "script_file": str(Path(__file__).resolve()),
-            "script_parent": str(Path(__file__).resolve().parent),
+            "script_file": _SCRIPT_FILE_STR,
+            "script_parent": _SCRIPT_DIR_STR,
             "templates_dir": str(TEMPLATES_DIR),
             "templates_dir_exists": TEMPLATES_DIR.exists(),
             "current_working_directory": str(Path.cwd())
         }
         logger.error(f"Error in get_pr_templates: {error_details}")
-        return json.dumps(error_details, indent=2)
+        return _dumps(error_details)
+
+
+def _suggest_template_dict(changes_summary: str, change_type: str) -> dict:
+    """Build the suggest_template result for a change type."""
+    template_file = TYPE_MAPPING.get(change_type.lower(), DEFAULT_TEMPLATE_FILE)
+    try:
+        _, selected_template = _load_template(template_file)
+    except OSError as e:
+        logger.warning("Could not load %s (%s), falling back to the first available template", template_file, e)
+        
+        templates_data = _get_pr_templates_dict()
+        
+        if "error" in templates_data:
+            return templates_data
+        
+        templates = templates_data.get("templates", [])
+        
+        if not templates:
+            return {
+                "error": "No templates available",
+                "suggestion": "Please ensure template files exist in the templates directory"
+            }
+        
+        selected_template = templates[0]
+    
+    return {
+        "recommended_template": selected_template,
+        "reasoning": f"Based on your analysis: '{changes_summary}', this appears to be a {change_type} change.",
+        "template_content": selected_template["content"],
+        "usage_hint": "Claude can help you fill out this template based on the specific changes in your PR."
+    }
 
 
 @mcp.tool()
@@ -342,35 +763,7 @@ async def suggest_template(changes_summary: str, change_type: str) -> str:
         changes_summary: Your analysis of what the changes do
         change_type: The type of change you've identified (bug, feature, docs, refactor, test, etc.)
     """
-    
-    templates_response = await get_pr_templates()
-    templates_data = json.loads(templates_response)
-    
-    if "error" in templates_data:
-        return templates_response
-    
-    templates = templates_data.get("templates", [])
-    
-    if not templates:
-        return json.dumps({
-            "error": "No templates available",
-            "suggestion": "Please ensure template files exist in the templates directory"
-        }, indent=2)
-    
-    template_file = TYPE_MAPPING.get(change_type.lower(), "feature.md")
-    selected_template = next(
-        (t for t in templates if t["filename"] == template_file),
-        templates[0]  # Default to first template if no match
-    )
-    
-    suggestion = {
-        "recommended_template": selected_template,
-        "reasoning": f"Based on your analysis: '{changes_summary}', this appears to be a {change_type} change.",
-        "template_content": selected_template["content"],
-        "usage_hint": "Claude can help you fill out this template based on the specific changes in your PR."
-    }
-    
-    return json.dumps(suggestion, indent=2)
+    return _dumps(_suggest_template_dict(changes_summary, change_type))
 
 
 
@@ -381,15 +774,15 @@ async def get_recent_actions_events(limit: int = 3) -> str:
     Args:
         limit: Maximum number of events to return (default: 10)
     """
-    if not EVENTS_FILE.exists():
-        return json.dumps([])
-    
-    with open(EVENTS_FILE, 'r') as f:
-        events = json.load(f)
+    if limit <= 0:
+        return _dumps([])
+    try:
+        events = _load_events()
+    except FileNotFoundError:
+        return _dumps([])
     
     # Return most recent events
-    recent = events[-limit:]
-    return json.dumps(recent, indent=2)
+    return _dumps(events[-limit:])
 
 
 @mcp.tool()
@@ -399,31 +792,24 @@ async def get_workflow_status(workflow_name: Optional[str] = None) -> str:
     Args:
         workflow_name: Optional specific workflow name to filter by
     """
-    if not EVENTS_FILE.exists():
-        return json.dumps({"message": "No GitHub Actions events received yet"})
-    
-    with open(EVENTS_FILE, 'r') as f:
-        events = json.load(f)
-    
+    try:
+        events = _load_events()
+    except FileNotFoundError:
+        events = []
     if not events:
-        return json.dumps({"message": "No GitHub Actions events received yet"})
-    
-    workflow_events = [
-        e for e in events 
-        if e.get("workflow_run") is not None
-    ]
-    
-    if workflow_name:
-        workflow_events = [
-            e for e in workflow_events
-            if e["workflow_run"].get("name") == workflow_name
-        ]
+        return _dumps({"message": "No GitHub Actions events received yet"})
     
+    # Single pass; only the latest run per workflow is kept
     workflows = {}
-    for event in workflow_events:
-        run = event["workflow_run"]
+    for event in events:
+        run = event.get("workflow_run")
+        if run is None:
+            continue
         name = run["name"]
-        if name not in workflows or run["updated_at"] > workflows[name]["updated_at"]:
+        if workflow_name and name != workflow_name:
+            continue
+        existing = workflows.get(name)
+        if existing is None or run["updated_at"] > existing["updated_at"]:
             workflows[name] = {
                 "name": name,
                 "status": run["status"],
@@ -433,7 +819,7 @@ async def get_workflow_status(workflow_name: Optional[str] = None) -> str:
                 "html_url": run["html_url"]
             }
     
-    return json.dumps(list(workflows.values()), indent=2)
+    return _dumps(list(workflows.values()))
 
 
 
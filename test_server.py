@@ -1,80 +1,217 @@
 #!/usr/bin/env python3
 
 import json
+import os
+import orjson
 import pytest
 import asyncio
+import subprocess
+from dataclasses import dataclass
 from pathlib import Path
-from unittest.mock import patch, MagicMock, AsyncMock
+from typing import Optional
 from server import (
     mcp,
     analyze_file_changes,
     get_pr_templates,
     suggest_template,
+    get_recent_actions_events,
+    get_workflow_status,
+    _get_pr_templates_dict,
+    _suggest_template_dict,
+    GitRepo,
+    _git_head,
     # create_default_template,
     TEMPLATES_DIR
 )
+from events_db import EVENTS_KEEP, connect_writer
+from aiohttp.test_utils import TestClient, TestServer
+from webhook_server import EVENT_QUEUE, EventLog, create_app
+
+
+@pytest.fixture(scope="session")
+def templates_dir():
+    return Path(__file__).parent / "templates"
+
+
+@pytest.fixture(scope="session")
+def primed_templates(templates_dir):
+    """Point the server at the repo's templates and load them once per session."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr('server.TEMPLATES_DIR', templates_dir)
+        asyncio.run(get_pr_templates())
+        yield templates_dir
+
+
+@dataclass(slots=True)
+class _FakeGit:
+    """Stand-in for server._git, server._git_head and GitRepo.resolve that counts its calls."""
+    name_status: bytes = b""
+    head: tuple = ("", 0)
+    # What every revision resolves to; None keeps analyze_file_changes on its diff path
+    oid: Optional[str] = None
+    calls: int = 0
+    head_calls: int = 0
+    
+    async def git(self, *args, **kwargs):
+        # -z name-status output is bytes, everything else text
+        self.calls += 1
+        if "--name-status" in args:
+            return subprocess.CompletedProcess(args, 0, stdout=self.name_status, stderr="")
+        return subprocess.CompletedProcess(args, 0, stdout="", stderr="")
+    
+    async def git_head(self, *args, **kwargs):
+        self.head_calls += 1
+        return self.head
+    
+    async def resolve(self, rev, timeout):
+        return self.oid
+
+
+@pytest.fixture
+def fake_git(monkeypatch):
+    fake = _FakeGit()
+    monkeypatch.setattr('server._git', fake.git)
+    monkeypatch.setattr('server._git_head', fake.git_head)
+    monkeypatch.setattr('server.GitRepo.resolve', fake.resolve)
+    return fake
 
 
 class TestAnalyzeFileChanges:
-    @pytest.mark.asyncio
-    async def test_analyze_with_diff(self):
-        mock_result = MagicMock()
-        mock_result.stdout = "M\tfile1.py\nA\tfile2.py\n"
-        mock_result.stderr = ""
-        
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = mock_result
-            
-            result = await analyze_file_changes("main", include_diff=True)
-            
-            assert isinstance(result, str)
-            data = json.loads(result)
-            assert data["base_branch"] == "main"
-            assert "files_changed" in data
-            assert "statistics" in data
-            assert "commits" in data
-            assert "diff" in data
-    
-    @pytest.mark.asyncio
-    async def test_analyze_without_diff(self):
-        mock_result = MagicMock()
-        mock_result.stdout = "M\tfile1.py\n"
-        
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = mock_result
-            
-            result = await analyze_file_changes("main", include_diff=False)
-            
-            data = json.loads(result)
-            assert "Diff not included" in data["diff"]
-    
-    @pytest.mark.asyncio
-    async def test_analyze_git_error(self):
-        with patch('subprocess.run') as mock_run:
-            mock_run.side_effect = Exception("Git not found")
-            
-            result = await analyze_file_changes("main", True)
-            
-            assert "error" in result
+    async def test_analyze_with_diff(self, fake_git):
+        fake_git.name_status = b"M\0file1.py\0A\0file2.py\0"
+        fake_git.head = ("diff --git a/file1.py b/file1.py\n", 1)
+        
+        result = await analyze_file_changes("main", include_diff=True)
+        
+        assert isinstance(result, str)
+        data = orjson.loads(result)
+        assert data["base_branch"] == "main"
+        assert data["files_changed"] == [
+            {"status": "M", "path": "file1.py"},
+            {"status": "A", "path": "file2.py"}
+        ]
+        assert "statistics" in data
+        assert "commits" in data
+        assert "diff" in data
+    
+    async def test_analyze_without_diff(self, fake_git):
+        fake_git.name_status = b"M\0file1.py\0"
+        
+        result = await analyze_file_changes("main", include_diff=False)
+        
+        data = orjson.loads(result)
+        assert "Diff not included" in data["diff"]
+    
+    async def test_analyze_truncates_diff(self, fake_git):
+        fake_git.name_status = b"M\0file1.py\0"
+        fake_git.head = ("+line\n" * 10, 250)
+        
+        result = await analyze_file_changes("main", include_diff=True, max_diff_lines=10)
+        
+        data = orjson.loads(result)
+        assert data["truncated"] is True
+        assert data["total_diff_lines"] == 250
+        assert "Showing 10 of 250 lines" in data["diff"]
+    
+    async def test_analyze_no_changes_skips_other_commands(self, fake_git):
+        result = await analyze_file_changes("main", include_diff=True)
+        
+        data = orjson.loads(result)
+        assert data["files_changed"] == []
+        assert data["total_diff_lines"] == 0
+        assert fake_git.calls == 1
+        assert fake_git.head_calls == 0
+    
+    async def test_analyze_same_commit_skips_git(self, fake_git):
+        fake_git.oid = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        
+        result = await analyze_file_changes("main", working_directory=".")
+        
+        data = orjson.loads(result)
+        assert data["files_changed"] == []
+        assert fake_git.calls == 0
+    
+    async def test_analyze_git_error(self, fake_git, monkeypatch):
+        async def failing_git(*args, **kwargs):
+            raise Exception("Git not found")
+        monkeypatch.setattr('server._git', failing_git)
+        
+        result = await analyze_file_changes("main", True)
+        
+        assert "error" in result
+    
+    async def test_analyze_git_failure_cancels_other_commands(self, fake_git, monkeypatch):
+        fake_git.name_status = b"M\0file1.py\0"
+        cancelled = asyncio.Event()
+        
+        async def git(*args, **kwargs):
+            if "--name-status" in args:
+                return await fake_git.git(*args, **kwargs)
+            if "log" in args:
+                raise subprocess.TimeoutExpired(["git", *args], 1)
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        monkeypatch.setattr('server._git', git)
+        
+        result = await analyze_file_changes("main", include_diff=False)
+        
+        assert "error" in orjson.loads(result)
+        assert cancelled.is_set()
+    
+    async def test_git_head_cuts_overlong_lines(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('server.DIFF_LINE_LIMIT', 1024)
+        (tmp_path / "new.txt").write_text("short\n" + "x" * 5000 + "\nafter\n")
+        
+        # --no-index diffs two files without needing a repository
+        diff, total = await _git_head(
+            "diff", "--no-index", "--", os.devnull, "new.txt",
+            cwd=str(tmp_path), timeout=10, max_lines=100
+        )
+        
+        lines = diff.splitlines()
+        assert total == len(lines)
+        assert lines[-3:] == ["+short", "+" + "x" * 1023, "+after"]
+    
+    async def test_resolve_outside_repository(self, tmp_path):
+        # cat-file exits straight away there; lookups must not raise or respawn it
+        repo = GitRepo(str(tmp_path))
+        try:
+            for _ in range(3):
+                assert await repo.resolve("HEAD", 5) is None
+        finally:
+            await repo.aclose()
 
 
 class TestPRTemplates:
-    @pytest.mark.asyncio
-    async def test_get_templates(self, tmp_path, monkeypatch):
-        # Set up test templates in the temporary directory
-        templates_dir = Path(__file__).parent / "templates"
-        monkeypatch.setattr('server.TEMPLATES_DIR', templates_dir)
-        
+    async def test_get_templates(self, primed_templates):
         # Call the function under test
         result = await get_pr_templates()
         
         # Verify the results
-        templates = json.loads(result)
+        templates = orjson.loads(result)["templates"]
         assert len(templates) > 0
         assert any(t["type"] == "Bug Fix" for t in templates)
         assert any(t["type"] == "Feature" for t in templates)
         assert all("content" in t for t in templates)
     
+    def test_get_templates_picks_up_changes(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('server.TEMPLATES_DIR', tmp_path)
+        template_path = tmp_path / "bug.md"
+        template_path.write_text("## Bug Fix v1", encoding='utf-8')
+        
+        first = _get_pr_templates_dict()
+        assert first["templates"][0]["content"] == "## Bug Fix v1"
+        
+        template_path.write_text("## Bug Fix v2", encoding='utf-8')
+        mtime_ns = template_path.stat().st_mtime_ns + 1_000_000_000
+        os.utime(template_path, ns=(mtime_ns, mtime_ns))
+        
+        second = _get_pr_templates_dict()
+        assert second["templates"][0]["content"] == "## Bug Fix v2"
+    
     # def test_create_default_template(self, tmp_path):
     #     template_path = tmp_path / "test.md"
         
@@ -88,86 +225,234 @@ class TestPRTemplates:
 
 
 class TestSuggestTemplate:
-    @pytest.mark.asyncio
-    async def test_suggest_bug_fix(self, tmp_path, monkeypatch):
-        tmp_path = Path(__file__).parent / "templates"
-        monkeypatch.setattr('server.TEMPLATES_DIR', tmp_path)
-        
-        # Create templates first
-        await get_pr_templates()
-        
+    async def test_suggest_bug_fix(self, primed_templates):
         result = await suggest_template(
             "Fixed null pointer exception in user service",
             "bug"
         )
         
-        suggestion = json.loads(result)
+        suggestion = orjson.loads(result)
         assert suggestion["recommended_template"]["filename"] == "bug.md"
         assert "Bug Fix" in suggestion["recommended_template"]["type"]
         assert "reasoning" in suggestion
     
-    @pytest.mark.asyncio
-    async def test_suggest_feature(self, tmp_path, monkeypatch):
-        tmp_path = Path(__file__).parent / "templates"
-        monkeypatch.setattr('server.TEMPLATES_DIR', tmp_path)
-        
-        await get_pr_templates()
-        
-        result = await suggest_template(
+    def test_suggest_feature(self, primed_templates):
+        suggestion = _suggest_template_dict(
             "Added new authentication method for API",
             "feature"
         )
         
-        suggestion = json.loads(result)
         assert suggestion["recommended_template"]["filename"] == "feature.md"
     
-    @pytest.mark.asyncio
-    async def test_suggest_with_type_variations(self, tmp_path, monkeypatch):
-        tmp_path = Path(__file__).parent / "templates"
+    @pytest.mark.parametrize("change_type,expected_file", [
+        ("fix", "bug.md"),
+        ("enhancement", "feature.md"),
+        ("documentation", "docs.md"),
+        ("cleanup", "refactor.md"),
+        ("testing", "test.md"),
+        ("optimization", "performance.md")
+    ])
+    def test_suggest_with_type_variations(self, primed_templates, change_type, expected_file):
+        suggestion = _suggest_template_dict(f"Some {change_type} work", change_type)
+        assert suggestion["recommended_template"]["filename"] == expected_file
+    
+    def test_suggest_falls_back_when_template_missing(self, tmp_path, monkeypatch):
         monkeypatch.setattr('server.TEMPLATES_DIR', tmp_path)
+        (tmp_path / "docs.md").write_text("## Documentation", encoding='utf-8')
         
-        await get_pr_templates()
+        suggestion = _suggest_template_dict("Fixed a crash", "bug")
         
-        # Test variations
-        for change_type, expected_file in [
-            ("fix", "bug.md"),
-            ("enhancement", "feature.md"),
-            ("documentation", "docs.md"),
-            ("cleanup", "refactor.md"),
-            ("testing", "test.md"),
-            ("optimization", "performance.md")
-        ]:
-            result = await suggest_template(f"Some {change_type} work", change_type)
-            suggestion = json.loads(result)
-            assert suggestion["recommended_template"]["filename"] == expected_file
+        assert suggestion["recommended_template"]["filename"] == "docs.md"
 
 
-class TestIntegration:
-    @pytest.mark.asyncio
-    async def test_full_workflow(self, tmp_path, monkeypatch):
-        tmp_path = Path(__file__).parent / "templates"
-        monkeypatch.setattr('server.TEMPLATES_DIR', tmp_path)
-        
-        # Mock git commands
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(
-                stdout="M\tsrc/main.py\nM\ttests/test_main.py\n",
-                stderr=""
-            )
-            
-            analysis_result = await analyze_file_changes("main", True)
-            templates_result = await get_pr_templates()
-            suggestion_result = await suggest_template(
-                "Updated main functionality and added tests",
-                "feature"
+def _workflow_event(name, run_number, updated_at, conclusion="success"):
+    return {
+        "event_type": "workflow_run",
+        "action": "completed",
+        "workflow_run": {
+            "name": name,
+            "run_number": run_number,
+            "status": "completed",
+            "conclusion": conclusion,
+            "updated_at": updated_at,
+            "html_url": f"https://github.com/user/repo/actions/runs/{run_number}"
+        }
+    }
+
+
+class TestActionsEvents:
+    @pytest.fixture
+    def events_db(self, tmp_path, monkeypatch):
+        events_db = tmp_path / "github_events.db"
+        monkeypatch.setattr('server.EVENTS_DB', events_db)
+        return events_db
+    
+    @staticmethod
+    def _store(events_db, events):
+        conn = connect_writer(events_db)
+        with conn:
+            conn.executemany(
+                "INSERT INTO events (ts, body) VALUES (?, ?)",
+                [(e.get("timestamp", ""), json.dumps(e)) for e in events]
             )
-            assert all(isinstance(r, str) for r in [analysis_result, templates_result, suggestion_result])
-            
-            suggestion = json.loads(suggestion_result)
-            assert "recommended_template" in suggestion
-            assert "template_content" in suggestion
-            assert suggestion["recommended_template"]["type"] == "Feature"
+        conn.close()
+    
+    async def test_recent_events_returns_latest(self, events_db):
+        self._store(events_db, [{"event_type": "push", "n": i} for i in range(20)])
+        
+        result = orjson.loads(await get_recent_actions_events(limit=5))
+        
+        assert [e["n"] for e in result] == [15, 16, 17, 18, 19]
+    
+    async def test_recent_events_follows_inserts_and_pruning(self, events_db):
+        self._store(events_db, [{"n": i} for i in range(3)])
+        assert [e["n"] for e in orjson.loads(await get_recent_actions_events(limit=10))] == [0, 1, 2]
+        
+        self._store(events_db, [{"n": 3}])
+        assert [e["n"] for e in orjson.loads(await get_recent_actions_events(limit=10))] == [0, 1, 2, 3]
+        
+        # Only the last EVENTS_KEEP events stay in the database
+        self._store(events_db, [{"n": i} for i in range(4, 4 + EVENTS_KEEP)])
+        result = orjson.loads(await get_recent_actions_events(limit=EVENTS_KEEP + 10))
+        assert [e["n"] for e in result] == list(range(4, 4 + EVENTS_KEEP))
+    
+    async def test_recent_events_follows_recreated_database(self, events_db):
+        self._store(events_db, [{"n": i} for i in range(3)])
+        assert [e["n"] for e in orjson.loads(await get_recent_actions_events(limit=10))] == [0, 1, 2]
+        
+        for path in events_db.parent.glob(events_db.name + "*"):
+            path.unlink()
+        assert orjson.loads(await get_recent_actions_events(limit=10)) == []
+        
+        self._store(events_db, [{"n": 7}])
+        assert [e["n"] for e in orjson.loads(await get_recent_actions_events(limit=10))] == [7]
+    
+    async def test_legacy_event_files_are_imported(self, events_db, monkeypatch):
+        legacy = events_db.with_name("github_events.jsonl")
+        monkeypatch.setattr('webhook_server.LEGACY_EVENTS_FILE', legacy)
+        # A multi-process webhook server wrote one file per worker
+        legacy.write_text("".join(json.dumps({"timestamp": f"2024-01-01T10:00:0{n}", "n": n}) + "\n" for n in (0, 3)))
+        events_db.with_name("github_events.0.jsonl").write_text(
+            "".join(json.dumps({"timestamp": f"2024-01-01T10:00:0{n}", "n": n}) + "\n" for n in (1, 4)) + '{"n": '
+        )
+        events_db.with_name("github_events.1.jsonl").write_text(json.dumps({"timestamp": "2024-01-01T10:00:02", "n": 2}) + "\n")
+        
+        for _ in range(2):  # imported on the first start only
+            log = EventLog(events_db)
+            log.load()
+            log.close()
+        
+        result = orjson.loads(await get_recent_actions_events(limit=10))
+        assert [e["n"] for e in result] == [0, 1, 2, 3, 4]
+    
+    async def test_recent_events_missing_database(self, events_db):
+        assert orjson.loads(await get_recent_actions_events()) == []
+    
+    async def test_workflow_status_keeps_latest_run(self, events_db):
+        self._store(events_db, [
+            _workflow_event("CI", 1, "2024-01-01T10:00:00Z", "failure"),
+            {"event_type": "push", "workflow_run": None},
+            _workflow_event("Deploy", 7, "2024-01-01T11:00:00Z"),
+            _workflow_event("CI", 2, "2024-01-01T12:00:00Z"),
+        ])
+        
+        workflows = {w["name"]: w for w in orjson.loads(await get_workflow_status())}
+        assert workflows["CI"]["run_number"] == 2
+        assert workflows["CI"]["conclusion"] == "success"
+        assert workflows["Deploy"]["run_number"] == 7
+        
+        only_ci = orjson.loads(await get_workflow_status("CI"))
+        assert [w["name"] for w in only_ci] == ["CI"]
+    
+    async def test_workflow_status_no_events(self, events_db):
+        self._store(events_db, [])
+        
+        result = orjson.loads(await get_workflow_status())
+        assert "message" in result
+
 
+class TestWebhook:
+    @pytest.fixture
+    async def client(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('webhook_server.LEGACY_EVENTS_FILE', tmp_path / "github_events.jsonl")
+        async with TestClient(TestServer(create_app(tmp_path / "events.db"))) as client:
+            yield client
+    
+    @staticmethod
+    async def _stored(client, tmp_path):
+        # Wait for the writer task, then read back what it inserted
+        await client.app[EVENT_QUEUE].join()
+        conn = connect_writer(tmp_path / "events.db")
+        try:
+            return [orjson.loads(body) for (body,) in conn.execute("SELECT body FROM events ORDER BY id")]
+        finally:
+            conn.close()
+    
+    async def test_json_body_is_stored(self, client, tmp_path):
+        resp = await client.post(
+            "/webhook/github",
+            data=json.dumps({"action": "completed", "repository": {"full_name": "o/r"}}),
+            headers={"X-GitHub-Event": "workflow_run", "Content-Type": "application/json"}
+        )
+        
+        assert resp.status == 202
+        events = await self._stored(client, tmp_path)
+        assert [(e["event_type"], e["action"], e["repository"]) for e in events] == [("workflow_run", "completed", "o/r")]
+    
+    async def test_form_payload_is_accepted(self, client, tmp_path):
+        resp = await client.post(
+            "/webhook/github",
+            data={"payload": json.dumps({"action": "requested"})},
+            headers={"X-GitHub-Event": "check_run"}
+        )
+        
+        assert resp.status == 202
+        assert [e["action"] for e in await self._stored(client, tmp_path)] == ["requested"]
+    
+    async def test_form_without_payload_is_rejected(self, client):
+        resp = await client.post("/webhook/github", data={"action": "requested"})
+        
+        assert resp.status == 400
+        assert (await resp.json())["message"] == "Invalid JSON"
+    
+    @pytest.mark.parametrize("body", ["[1, 2]", '"str"', "null"])
+    async def test_non_object_json_is_rejected(self, client, tmp_path, body):
+        resp = await client.post(
+            "/webhook/github", data=body, headers={"Content-Type": "application/json"}
+        )
+        
+        assert resp.status == 400
+        assert await self._stored(client, tmp_path) == []
+    
+    async def test_body_over_aiohttp_default_limit_is_accepted(self, client, tmp_path):
+        # aiohttp rejects bodies over 1 MiB by default; GitHub sends up to 25 MB
+        body = json.dumps({"action": "pushed", "commits": ["x" * 1024] * 2048})
+        assert len(body) > 1024 * 1024
+        
+        resp = await client.post(
+            "/webhook/github", data=body, headers={"Content-Type": "application/json"}
+        )
+        
+        assert resp.status == 202
+        assert [e["action"] for e in await self._stored(client, tmp_path)] == ["pushed"]
+
+
+class TestIntegration:
+    async def test_full_workflow(self, primed_templates, fake_git):
+        fake_git.name_status = b"M\0src/main.py\0M\0tests/test_main.py\0"
+        
+        analysis_result = await analyze_file_changes("main", True)
+        templates_result = await get_pr_templates()
+        suggestion_result = await suggest_template(
+            "Updated main functionality and added tests",
+            "feature"
+        )
+        assert all(isinstance(r, str) for r in [analysis_result, templates_result, suggestion_result])
+        
+        suggestion = orjson.loads(suggestion_result)
+        assert "recommended_template" in suggestion
+        assert "template_content" in suggestion
+        assert suggestion["recommended_template"]["type"] == "Feature"
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -3,100 +3,288 @@
 GitHub Actions webhook server that stores events for MCP server.
 """
 
-import json
-from datetime import datetime
+import asyncio
+import contextlib
+import heapq
+import multiprocessing
+import os
+import sqlite3
+import time
 from pathlib import Path
+from typing import List, Optional
+
+import orjson
 from aiohttp import web
-from logger import get_logger
+from logger import setup_logger
+from events_db import EVENTS_DB, EVENTS_KEEP, connect_writer
 
-EVENTS_FILE = Path(__file__).parent / "github_events.json"
+try:
+    # Optional: a faster event loop (pip install "pr-agent-actions[speedups]")
+    import uvloop
+except ImportError:
+    uvloop = None
 
-async def handle_webhook(request):
-    """Handle incoming GitHub webhook"""
-    logger = get_logger(__name__)
-    try:
-        data = await request.json()
-        
-        event_type = request.headers.get("X-GitHub-Event", "unknown")
-        logger.info(f"Received GitHub webhook event: {event_type}")
-        
-        event = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "event_type": event_type,
-            "action": data.get("action"),
-            "workflow_run": data.get("workflow_run"),
-            "check_run": data.get("check_run"),
-            "repository": data.get("repository", {}).get("full_name"),
-            "sender": data.get("sender", {}).get("login")
-        }
-        
-        # Read existing events
-        if EVENTS_FILE.exists():
+logger = setup_logger(__name__)
+
+# Events from older versions, which stored them as JSON Lines (plus one
+# github_events.<n>.jsonl per worker); imported once into a new events database
+LEGACY_EVENTS_FILE = Path(__file__).parent / "github_events.jsonl"
+# Most events the writer inserts in one transaction
+EVENTS_BATCH_SIZE = 64
+
+# Worker processes sharing the port via SO_REUSEPORT; they all write to the
+# same events database
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "1"))
+
+# Largest request body accepted; bigger ones are rejected with 413 before parsing.
+# GitHub caps webhook payloads at 25 MB, so this is the most a delivery can be;
+# aiohttp's 1 MiB default would turn large push events into 413s
+MAX_PAYLOAD_BYTES = 25 * 1024 * 1024
+# Webhook deliveries are short one-off POSTs, so idle connections are closed sooner
+KEEPALIVE_TIMEOUT = 15.0
+LISTEN_BACKLOG = 512
+
+# Events waiting for the background writer
+EVENT_QUEUE = web.AppKey("event_queue", asyncio.Queue)
+EVENT_WRITER = web.AppKey("event_writer", asyncio.Task)
+EVENT_LOG = web.AppKey("event_log", "EventLog")
+
+# Handler responses never vary, so their bodies are encoded once. Response
+# objects themselves cannot be reused across requests
+_ACCEPTED_BODY = orjson.dumps({"status": "accepted"})
+_INVALID_JSON_BODY = orjson.dumps({"status": "error", "message": "Invalid JSON"})
+_SERVER_ERROR_BODY = orjson.dumps({"status": "error", "message": "Internal server error"})
+
+def _legacy_events() -> List[dict]:
+    """The last EVENTS_KEEP events across the old JSON Lines files, oldest first."""
+    shards = LEGACY_EVENTS_FILE.parent.glob(f"{LEGACY_EVENTS_FILE.stem}.*{LEGACY_EVENTS_FILE.suffix}")
+    lists = []
+    for path in [LEGACY_EVENTS_FILE, *sorted(shards)]:
+        try:
+            with open(path, 'rb') as f:
+                lines = f.readlines()[-EVENTS_KEEP:]
+        except FileNotFoundError:
+            continue
+        events = []
+        for line in lines:
             try:
-                with open(EVENTS_FILE, 'r') as f:
-                    events = json.load(f)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error reading events file: {e}")
-                events = []
-        else:
-            events = []
-            
-        # Add new event and keep only last 100
-        events.append(event)
-        events = events[-100:]
-        
-        # Save back to file
+                events.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                continue  # e.g. a half-written last line
+        lists.append(events)
+    # Each file is in arrival order; worker files interleave by timestamp
+    merged = list(heapq.merge(*lists, key=lambda e: e.get("timestamp") or ""))
+    return merged[-EVENTS_KEEP:]
+
+class EventLog:
+    """Writes events to the SQLite events database.
+
+    Only the writer task touches an EventLog, always from a worker thread,
+    so the connection is never used by two threads at once. Old events are
+    pruned by a trigger in the database itself.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def load(self) -> None:
+        """Open the database, importing events left in the old JSON Lines files."""
+        self.conn = connect_writer(self.path)
+        if self._ever_written():
+            return
+        events = _legacy_events()
+        if not events:
+            return
+        with self.conn:
+            # Take the write lock and check again, so that when several workers
+            # start together only the first one imports
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self._ever_written():
+                return
+            self._insert(events)
+        logger.info(f"Imported {len(events)} events from {LEGACY_EVENTS_FILE.name} and its worker files")
+
+    def _ever_written(self) -> bool:
+        # AUTOINCREMENT keeps the highest id here even after rows are pruned
+        return self.conn.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'events'").fetchone() is not None
+
+    def _insert(self, events: List[dict]) -> None:
+        self.conn.executemany(
+            "INSERT INTO events (ts, body) VALUES (?, ?)",
+            [(e.get("timestamp") or "", orjson.dumps(e)) for e in events]
+        )
+
+    def append(self, events: List[dict]) -> None:
+        """Insert a batch of events in a single transaction."""
+        with self.conn:
+            self._insert(events)
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+async def _event_writer(queue: asyncio.Queue, log: EventLog):
+    """Drain the event queue, inserting whatever has accumulated as one batch."""
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < EVENTS_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
         try:
-            with open(EVENTS_FILE, 'w') as f:
-                json.dump(events, f, indent=2)
-            logger.debug(f"Successfully saved event to {EVENTS_FILE}")
-            return web.json_response({"status": "success"})
-            
+            # The disk I/O runs in a worker thread so it does not stall requests
+            await asyncio.to_thread(log.append, batch)
+            logger.debug(f"Saved {len(batch)} events to {log.path}")
         except Exception as e:
-            logger.error(f"Error saving events file: {e}", exc_info=True)
-            return web.json_response(
-                {"status": "error", "message": "Failed to save event"}, 
-                status=500
-            )
-            
-    except json.JSONDecodeError as e:
+            logger.error(f"Error saving events: {e}", exc_info=True)
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+# UTC "YYYY-MM-DDTHH:MM:SS" for the current second, reformatted once per second
+_ts_second = -1
+_ts_prefix = ""
+
+def _utc_timestamp() -> str:
+    """Current UTC time in datetime.isoformat() form, with microseconds."""
+    global _ts_second, _ts_prefix
+    second, ns = divmod(time.time_ns(), 1_000_000_000)
+    if second != _ts_second:
+        _ts_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _ts_second = second
+    return f"{_ts_prefix}.{ns // 1000:06d}"
+
+def _json_body_response(body: bytes, status: int) -> web.Response:
+    return web.Response(body=body, status=status, content_type='application/json')
+
+async def _read_payload(request) -> Optional[dict]:
+    """Parse the webhook body, or return None if it is not a JSON object."""
+    try:
+        form = None
+        if request.content_type == 'application/x-www-form-urlencoded':
+            # GitHub's "application/x-www-form-urlencoded" content type option
+            # sends the JSON document in a "payload" form field
+            form = await request.post()
+        if form and 'payload' in form:
+            data = orjson.loads(form['payload'])
+        else:
+            # Parse the raw body; request.json() would decode it to str first
+            data = orjson.loads(await request.read())
+    except orjson.JSONDecodeError as e:
         logger.error(f"Invalid JSON in request: {e}", exc_info=True)
-        return web.json_response(
-            {"status": "error", "message": "Invalid JSON"}, 
-            status=400
-        )
+        return None
+    if not isinstance(data, dict):
+        logger.error(f"Webhook payload is a JSON {type(data).__name__}, not an object")
+        return None
+    return data
+
+def _nested(data: dict, key: str, field: str):
+    """data[key][field], or None when either level is missing or null."""
+    value = data.get(key)
+    return value.get(field) if isinstance(value, dict) else None
+
+def _build_event(event_type: str, data: dict) -> dict:
+    get = data.get
+    return {
+        "timestamp": _utc_timestamp(),
+        "event_type": event_type,
+        "action": get("action"),
+        "workflow_run": get("workflow_run"),
+        "check_run": get("check_run"),
+        "repository": _nested(data, "repository", "full_name"),
+        "sender": _nested(data, "sender", "login")
+    }
+
+async def handle_webhook(request):
+    """Handle incoming GitHub webhook"""
+    data = await _read_payload(request)
+    if data is None:
+        return _json_body_response(_INVALID_JSON_BODY, 400)
+    
+    event_type = request.headers.get("X-GitHub-Event", "unknown")
+    logger.info(f"Received GitHub webhook event: {event_type}")
+    
+    try:
+        event = _build_event(event_type, data)
     except Exception as e:
         logger.error(f"Error handling webhook: {e}", exc_info=True)
-        return web.json_response(
-            {"status": "error", "message": "Internal server error"}, 
-            status=500
-        )
+        return _json_body_response(_SERVER_ERROR_BODY, 500)
+    
+    # Hand the event to the writer task; it is written shortly after
+    request.app[EVENT_QUEUE].put_nowait(event)
+    return _json_body_response(_ACCEPTED_BODY, 202)
 
-def create_app():
+def create_app(events_db: Optional[Path] = None):
     """Create and configure the web application"""
-    logger = get_logger(__name__)
-    
-    app = web.Application()
+    app = web.Application(client_max_size=MAX_PAYLOAD_BYTES)
     app.router.add_post('/webhook/github', handle_webhook)
     
     @app.on_startup.append
     async def on_startup(app):
         logger.info("GitHub webhook server starting...")
+        app[EVENT_LOG] = EventLog(events_db or EVENTS_DB)
+        await asyncio.to_thread(app[EVENT_LOG].load)
+        app[EVENT_QUEUE] = asyncio.Queue()
+        app[EVENT_WRITER] = asyncio.create_task(_event_writer(app[EVENT_QUEUE], app[EVENT_LOG]))
         
     @app.on_shutdown.append
     async def on_shutdown(app):
         logger.info("GitHub webhook server shutting down...")
     
+    @app.on_cleanup.append
+    async def on_cleanup(app):
+        # Runs once in-flight requests are done, so nothing else gets queued
+        await app[EVENT_QUEUE].join()
+        app[EVENT_WRITER].cancel()
+        # Make sure the writer has stopped before its connection is closed
+        with contextlib.suppress(asyncio.CancelledError):
+            await app[EVENT_WRITER]
+        await asyncio.to_thread(app[EVENT_LOG].close)
+    
     return app
 
+def run_worker(host: str, port: int, reuse_port: bool = False):
+    """Serve webhooks until interrupted."""
+    loop = uvloop.new_event_loop() if uvloop is not None else None
+    web.run_app(
+        create_app(),
+        host=host,
+        port=port,
+        access_log=None,  # Disable aiohttp access logs
+        backlog=LISTEN_BACKLOG,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        # Cancel handlers whose client disconnected instead of running them to the end
+        handler_cancellation=True,
+        reuse_port=reuse_port,
+        loop=loop
+    )
+
 if __name__ == '__main__':
-    logger = get_logger(__name__)
-    app = create_app()
-    
     host = '0.0.0.0'
     port = 8080
     
     logger.info(f"Starting GitHub webhook server on http://{host}:{port}")
     logger.info("Configure your GitHub webhook to POST to http://your-server:8080/webhook/github")
     
-    web.run_app(app, host=host, port=port, access_log=None)  # Disable aiohttp access logs
\ No newline at end of file
+    if uvloop is not None:
+        logger.info("Using uvloop event loop")
+    
+    if WEBHOOK_WORKERS <= 1:
+        run_worker(host, port)
+    else:
+        logger.info(f"Starting {WEBHOOK_WORKERS} worker processes")
+        # spawn, not fork: each worker needs its own logging listener thread
+        ctx = multiprocessing.get_context("spawn")
+        workers = [
+            ctx.Process(target=run_worker, args=(host, port, True))
+            for _ in range(WEBHOOK_WORKERS)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Ctrl+C reaches the workers too; let them finish writing their events
+            for worker in workers:
+                worker.join()